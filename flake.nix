@@ -18,6 +18,7 @@
           matplotlib
           tomli
           toml
+          orjson
           click
           cryptography
           requests
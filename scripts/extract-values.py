@@ -18,14 +18,25 @@ import os
 import re
 import sys
 import json
+import shlex
 import subprocess
 import tomli
 import ast
+from operator import itemgetter
 from pathlib import Path
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, Iterator, List, Optional, Any, Tuple
 from dataclasses import dataclass
 
-@dataclass
+try:
+    import orjson
+except ImportError:  # orjson is optional; json.loads also accepts bytes
+    orjson = None
+
+# orjson turns integers outside the 64-bit range into floats; any run of 19+
+# digits might be one, so such input goes to json.loads instead
+_LONG_DIGITS_RE = re.compile(rb'\d{19}')
+
+@dataclass(slots=True, frozen=True)
 class CSFAnnotation:
     """Represents a parsed CSF declarative annotation"""
     annotation_type: str  # ARTIFACT, STAT, TABLE, COMPUTE
@@ -38,25 +49,77 @@ class CSFAnnotation:
     expression: Optional[str] = None
     line_number: int = 0  # Line number in LaTeX file
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ExtractedValue:
     """Represents an extracted computational value"""
     name: str
     value: Any
-    formatted_value: str
     step: str
     script: Optional[str] = None
     value_type: str = "unknown"
     line: Optional[int] = None
 
+    @property
+    def formatted_value(self) -> str:
+        """Value formatted for display, computed on demand"""
+        if isinstance(self.value, float):
+            return format(self.value, ".6g")
+        return str(self.value)
+
+def _scripts_in_cmd(cmd: str) -> List[str]:
+    """Return the tokens of a pipeline command that look like script paths."""
+    try:
+        tokens = shlex.split(cmd)
+    except ValueError:
+        # Unbalanced quotes; fall back to plain whitespace splitting
+        tokens = cmd.split()
+    return [token for token in tokens if token.endswith(".py") or "/" in token]
+
+def _path_suffixes(path: str) -> List[str]:
+    """Return a normalized path and each shorter run of its trailing components.
+
+    Matching on whole components lets analysis.py find a step running
+    scripts/analysis.py while foo.py never matches one running subfoo.py.
+    """
+    path = os.path.normpath(path)
+    parts = path.split(os.sep)
+    return [path] + [os.sep.join(parts[i:]) for i in range(1, len(parts))]
+
+def _json_loads(data: bytes) -> Any:
+    """Decode JSON with orjson when available, falling back to json.loads.
+
+    orjson rejects the NaN/Infinity literals that json.dumps writes by default,
+    so those lines are retried with the stdlib decoder. It also silently
+    decodes integers beyond 64 bits as floats, so input containing a long run
+    of digits skips orjson altogether.
+    """
+    if orjson is not None and not _LONG_DIGITS_RE.search(data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+def _write_atomic(path: Path, data: bytes):
+    """Write a file via a temporary sibling so readers never see a partial file."""
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
 class ValueExtractor:
     """Extracts values from pipeline execution for CSF declarative injection"""
     
     def __init__(self, project_root: str = ".", config_file: Optional[str] = None):
         self.project_root = Path(project_root).resolve()
+        self._script_to_step: Dict[str, str] = {}
+        self._value_meta_by_name: Dict[str, Dict[str, Any]] = {}
         self.config = self._load_config(config_file)
         self.annotations: List[CSFAnnotation] = []
         self.values: Dict[str, ExtractedValue] = {}
+        self.values_cached = False
         
     def _load_config(self, config_file: Optional[str]) -> Dict[str, Any]:
         """Load configuration from a JSON file."""
@@ -70,67 +133,87 @@ class ValueExtractor:
         if not config_path.exists():
             raise FileNotFoundError(f"Configuration file not found: {config_path}")
             
-        with open(config_path, "r") as f:
-            return json.load(f)
+        config = _json_loads(config_path.read_bytes())
+        self._index_config(config)
+        return config
     
-    def read_provenance_log(self) -> List[Dict[str, Any]]:
-        """Reads the provenance log and returns a list of value entries."""
+    def _index_config(self, config: Dict[str, Any]):
+        """Index pipeline steps by script and value name in a single walk."""
+        script_suffixes = []
+        for step in config.get("pipeline", []):
+            cmd = step.get("cmd", "")
+            for script in _scripts_in_cmd(cmd):
+                # First step that runs a script wins, as with the old linear scan
+                full_path, *suffixes = _path_suffixes(script)
+                self._script_to_step.setdefault(full_path, step.get("name"))
+                script_suffixes.extend((suffix, step.get("name")) for suffix in suffixes)
+
+            # The 'outputs' key is a list of strings, not a dict.
+            # We need to look for value definitions in a different section,
+            # which we will assume is `outputs.values` for now; a plain list
+            # of outputs may itself contain an entry named 'values'.
+            if isinstance(step.get('outputs'), dict) and 'values' in step['outputs']:
+                cmd_tokens = cmd.split()
+                for output in step['outputs']['values']:
+                    self._value_meta_by_name.setdefault(output.get("name"), {
+                        "step": step.get("name"),
+                        "script": cmd_tokens[-1] if cmd_tokens else None, # simplified
+                        "line": output.get("line"),
+                        "expression": output.get("expression"),
+                        "value_type": output.get("type", "value")
+                    })
+
+        # Bare file names and partial paths never shadow a full script path
+        for suffix, step_name in script_suffixes:
+            self._script_to_step.setdefault(suffix, step_name)
+
+    def _iter_provenance(self) -> Iterator[Dict[str, Any]]:
+        """Yield parsed provenance log entries one line at a time."""
         provenance_log = self.project_root / ".csf/provenance.log"
         if not provenance_log.exists():
-            return []
+            return
+
+        with open(provenance_log, "rb") as f:
+            for line in f:
+                if line.strip():
+                    yield _json_loads(line)
 
-        with open(provenance_log, "r") as f:
-            return [json.loads(line) for line in f]
+    def read_provenance_log(self) -> List[Dict[str, Any]]:
+        """Reads the provenance log and returns a list of value entries."""
+        return list(self._iter_provenance())
     
     def _find_metadata_for_value(self, name: str) -> Optional[Dict[str, Any]]:
         """Find value metadata from the parsed composable.toml."""
-        for step in self.config.get("pipeline", []):
-            # The 'outputs' key is a list of strings, not a dict.
-            # We need to look for value definitions in a different section,
-            # which we will assume is `outputs.values` for now.
-            if 'outputs' in step and 'values' in step['outputs']:
-                for output in step['outputs']['values']:
-                    if output.get("name") == name:
-                        return {
-                            "step": step.get("name"),
-                            "script": step.get("cmd", "").split()[-1], # simplified
-                            "line": output.get("line"),
-                            "expression": output.get("expression"),
-                            "value_type": output.get("type", "value")
-                        }
-        return None
+        return self._value_meta_by_name.get(name)
 
     def _find_step_for_script(self, script_path: str) -> Optional[str]:
         """Find the pipeline step that runs a given script."""
-        for step in self.config.get("pipeline", []):
-            cmd = step.get("cmd", "")
-            if script_path in cmd:
-                return step.get("name")
-        return None
+        path = os.path.normpath(script_path)
+        step = self._script_to_step.get(path)
+        if step is None and os.path.isabs(path):
+            path = os.path.relpath(path, self.project_root)
+            step = self._script_to_step.get(path)
+        return step
     
     def extract_values_from_log(self) -> Dict[str, ExtractedValue]:
         """Extracts values from the provenance log."""
         values = {}
-        log_entries = self.read_provenance_log()
 
-        for entry in log_entries:
+        # The script path and line number are directly in the log
+        pick = itemgetter("name", "value", "filepath", "lineno")
+
+        for entry in self._iter_provenance():
             if entry.get("type") != "value":
                 continue
 
-            name = entry["name"]
-            value = entry["value"]
-            
-            # The script path and line number are now directly in the log
-            script = entry["filepath"]
-            line = entry["lineno"]
-            
+            name, value, script, line = pick(entry)
+
             # We can still look up the step in composable.toml
             step = self._find_step_for_script(script)
 
             values[name] = ExtractedValue(
                 name=name,
                 value=value,
-                formatted_value=str(value),
                 step=step or "unknown",
                 script=script,
                 line=line,
@@ -159,7 +242,6 @@ class ValueExtractor:
                 return ExtractedValue(
                     name=name,
                     value=value,
-                    formatted_value=str(value),
                     step=metadata.get("step", "unknown"),
                     script=script,
                     value_type=metadata.get("value_type", "value"),
@@ -201,40 +283,44 @@ class ValueExtractor:
             return 0.943
         else:
             return 42.0
-    
-    def generate_values_tex(self) -> str:
-        """Generate .csf/values.tex with LaTeX value definitions"""
+
+    def _generate_values_tex_bytes(self) -> bytearray:
+        """Build the UTF-8 encoded contents of .csf/values.tex"""
         if not self.values:
-            return "% No values extracted\n"
-            
-        lines = [
-            "% CSF Values - Auto-generated by extract-values.py",
-            f"% Generated from {len(self.values)} statistical annotations",
-            "% Do not edit manually - regenerate with 'cstex-compile'",
-            ""
-        ]
-        
+            return bytearray(b"% No values extracted\n")
+
+        buf = bytearray(b"% CSF Values - Auto-generated by extract-values.py\n")
+        buf += f"% Generated from {len(self.values)} statistical annotations\n".encode("utf-8")
+        buf += b"% Do not edit manually - regenerate with 'cstex-compile'\n\n"
+
+        # Bind the template once; encoding per line avoids building a joined str
+        define_value = "\\csfdefinevalue{{{}}}{{{}}}{{{}}}{{{}}}\n".format
         for name, value in self.values.items():
-            # Define the value
-            lines.append(f"\\csfdefinevalue{{{name}}}{{{value.value}}}{{{value.step}}}{{{value.value_type}}}")
-            
-        lines.append("")
-        lines.append("% Mark values as cached")
-        lines.append("\\csfvaluescachedtrue")
-        lines.append("")
-        
-        return "\n".join(lines)
+            buf += define_value(name, value.value, value.step, value.value_type).encode("utf-8")
+
+        buf += b"\n% Mark values as cached\n\\csfvaluescachedtrue\n"
+        return buf
+
+    def generate_values_tex(self) -> str:
+        """Generate .csf/values.tex with LaTeX value definitions"""
+        return self._generate_values_tex_bytes().decode("utf-8")
     
     def create_csf_values_file(self) -> str:
-        """Create .csf/values.tex file"""
+        """Create .csf/values.tex file, skipping the write when its contents are unchanged"""
         csf_dir = self.project_root / ".csf"
         csf_dir.mkdir(exist_ok=True)
         
-        values_content = self.generate_values_tex()
         values_file = csf_dir / "values.tex"
-        
-        with open(values_file, 'w') as f:
-            f.write(values_content)
+        content = self._generate_values_tex_bytes()
+
+        # Leave an identical file untouched so LaTeX does not see a change
+        try:
+            self.values_cached = values_file.read_bytes() == content
+        except FileNotFoundError:
+            self.values_cached = False
+
+        if not self.values_cached:
+            _write_atomic(values_file, content)
             
         return str(values_file)
     
@@ -242,16 +328,26 @@ class ValueExtractor:
         """Complete processing pipeline for value extraction from the provenance log."""
         print("🔄 Extracting values from .csf/provenance.log...")
         
-        # Extract values from the log
-        values = self.extract_values_from_log()
-        print(f"📊 Extracted {len(values)} computational values")
+        provenance_log = self.project_root / ".csf/provenance.log"
+        if not provenance_log.exists() or provenance_log.stat().st_size == 0:
+            # Nothing to parse; an existing identical stub is left untouched below
+            print("ℹ️  No provenance log entries found, skipping extraction")
+            self.values = {}
+            values = self.values
+        else:
+            # Extract values from the log
+            values = self.extract_values_from_log()
+            print(f"📊 Extracted {len(values)} computational values")
         
         for name, value in values.items():
             print(f"  • {name} = {value.value} (from {value.script}:{value.line})")
         
         # Generate values file
         values_file = self.create_csf_values_file()
-        print(f"✅ Generated {values_file}")
+        if self.values_cached:
+            print(f"♻ Cached {values_file}")
+        else:
+            print(f"✅ Generated {values_file}")
         
         return {
             "values": values,
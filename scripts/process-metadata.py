@@ -20,11 +20,118 @@ import re
 import sys
 import json
 import tomli
+import fnmatch
+import mmap
+import bisect
 import hashlib
+import functools
+import contextlib
+import itertools
+import subprocess
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, Iterator, List, Optional, Tuple, Any
 from dataclasses import dataclass
 
+# Patterns that scan document and script content can opt into google-re2's
+# linear-time engine with CSTEX_USE_RE2=1; output globs always use re, since
+# fnmatch.translate emits constructs RE2 does not support
+_re = re
+if os.environ.get("CSTEX_USE_RE2") == "1":
+    try:
+        import re2 as _re
+    except ImportError:
+        pass
+
+# New simplified CSF link commands, scanned in one pass over the raw file
+# bytes; the index of the group that matched gives the artifact type
+_CSF_LINK_RE = _re.compile(
+    rb'\\csfvaluelink\{([^}]+)\}'
+    rb'|\\csflink\{([^}]+)\}'
+)
+_CSF_LINK_TYPES = {1: 'value', 2: 'artifact'}
+
+_INCLUDEGRAPHICS_RE = _re.compile(r'\\includegraphics(?:\[[^\]]*\])?\{([^}]+)\}')
+_INPUT_CSV_RE = _re.compile(r'\\input\{([^}]+\.csv)\}')
+_BEGIN_TABLE_RE = _re.compile(r'\\begin\{(table|tabular)\}')
+_CSFIGURE_RE = _re.compile(r'\\csfigure')
+_CAPTION_RE = _re.compile(r'\\caption\{([^}]+)\}')
+_DOCUMENTCLASS_RE = _re.compile(rb'\\documentclass\{[^}]+\}')
+_NUMBER_RE = _re.compile(r'\b\d+\.?\d*\b')
+_SCRIPT_REF_RE = _re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*\.py)')
+_COMMENT_SCRIPT_REF_RE = _re.compile(r'%.*?([a-zA-Z_][a-zA-Z0-9_]*\.py)')
+_KV_RE = _re.compile(r'([^=,\s]+)\s*=\s*([^,]*)')
+
+# Keywords marking the script line that saves an artifact, writes a CSV,
+# or computes a statistic ('save' also covers 'savefig')
+_SAVE_KW_RE = _re.compile(r'save|write')
+_CSV_WRITE_KW_RE = _re.compile(r'to_csv|write')
+_STAT_KW_RE = _re.compile(r'(?i)corr|mean|std|pvalue|ttest|chi2')
+
+# Patterns for common statistical outputs
+_STAT_PATTERNS = [
+    # p-values: p = 0.05, p < 0.001, etc.
+    (r'p\s*[=<>]\s*([0-9]+\.?[0-9]*(?:e-?[0-9]+)?)', 'p_value'),
+    
+    # Correlations: r = 0.85, R² = 0.72, etc.
+    (r'[Rr]²?\s*=\s*([0-9]+\.?[0-9]*)', 'correlation'),
+    
+    # Confidence intervals: 95% CI [1.2, 3.4]
+    (r'(\d+)%\s*CI\s*\[([0-9.,\-\s]+)\]', 'confidence_interval'),
+    
+    # Sample sizes: n = 1000, N = 500
+    (r'[Nn]\s*=\s*([0-9,]+)', 'sample_size'),
+    
+    # Means and standard deviations: μ = 42.5 ± 3.2
+    (r'[μm]\s*=\s*([0-9.]+)\s*[±]\s*([0-9.]+)', 'mean_std'),
+    
+    # Percentages: 85.3%, significant at α = 0.05
+    (r'([0-9.]+)%', 'percentage'),
+    (r'α\s*=\s*([0-9.]+)', 'alpha_level')
+]
+
+# Statistical patterns as one alternation, so the content is scanned once;
+# the named group that matched is the statistic type. Percentages also occur
+# inside other statistics (95% CI [...], α = 5%), which the alternation would
+# consume, so they keep a separate pass.
+_STAT_RE = _re.compile('|'.join(
+    f'(?P<{stat_type}>{pattern})' for pattern, stat_type in _STAT_PATTERNS if stat_type != 'percentage'
+))
+_PERCENTAGE_RE = _re.compile('|'.join(
+    f'(?P<{stat_type}>{pattern})' for pattern, stat_type in _STAT_PATTERNS if stat_type == 'percentage'
+))
+
+# Output patterns without these characters are literal paths
+_GLOB_CHARS_RE = re.compile(r'[*?\[]')
+
+@functools.lru_cache(maxsize=256)
+def _compile_glob(pattern: str) -> re.Pattern:
+    """Compile a composable.toml output glob into a regex matching like fnmatch.fnmatchcase."""
+    return re.compile(fnmatch.translate(pattern))
+
+@contextlib.contextmanager
+def _map_file(path: Path) -> Iterator[Any]:
+    """Memory-map a file read-only, yielding b"" for empty files (mmap rejects them)"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+@functools.lru_cache(maxsize=None)
+def _git_short_head(project_root: str) -> str:
+    """Short commit hash of HEAD in project_root, looked up once per process."""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=project_root
+        )
+        if result.returncode == 0:
+            return result.stdout.strip()
+    except Exception:
+        pass
+    return "unknown"
+
 @dataclass
 class PipelineStep:
     """Represents a pipeline step from composable.toml"""
@@ -50,6 +157,9 @@ class MetadataProcessor:
         self.project_root = Path(project_root).resolve()
         self.pipeline_steps: Dict[str, PipelineStep] = {}
         self.artifact_map: Dict[str, ArtifactMetadata] = {}
+        self._literal_output_index: Dict[str, Tuple[int, PipelineStep]] = {}
+        self._glob_outputs: List[Tuple[int, re.Pattern, PipelineStep]] = []
+        self._script_text_cache: Dict[Path, str] = {}
         self.config = self._load_config(config_file)
         
     def _load_config(self, config_file: Optional[str]) -> Dict[str, Any]:
@@ -77,26 +187,49 @@ class MetadataProcessor:
                 flake=step_config.get("flake")
             )
             self.pipeline_steps[step.name] = step
+
+        # Index literal outputs by path and translate globs once, instead of on
+        # every artifact lookup. Each output keeps its position in the manifest
+        # so the first matching output still wins.
+        self._literal_output_index = {}
+        self._glob_outputs = []
+        position = 0
+        for step in self.pipeline_steps.values():
+            for pattern in step.outputs:
+                if _GLOB_CHARS_RE.search(pattern):
+                    self._glob_outputs.append((position, _compile_glob(pattern), step))
+                else:
+                    self._literal_output_index.setdefault(pattern, (position, step))
+                position += 1
             
         return config
+
+    def _find_step_for_output(self, artifact_path: str) -> Optional[PipelineStep]:
+        """Find the first pipeline step whose outputs match an artifact path"""
+        literal = self._literal_output_index.get(artifact_path)
+        for position, regex, step in self._glob_outputs:
+            # Only globs listed before the literal match can take precedence over it
+            if literal and position > literal[0]:
+                break
+            if regex.match(artifact_path):
+                return step
+        return literal[1] if literal else None
     
     def _match_artifact_to_step(self, artifact_path: str) -> Optional[ArtifactMetadata]:
         """Match an artifact path to a pipeline step that generates it"""
-        for step_name, step in self.pipeline_steps.items():
-            for output_pattern in step.outputs:
-                # Convert glob pattern to regex
-                regex_pattern = output_pattern.replace("*", ".*").replace("?", ".")
-                if re.match(regex_pattern, artifact_path):
-                    # Try to find the script that generates this artifact
-                    script_path = self._find_generating_script(step, artifact_path)
-                    
-                    return ArtifactMetadata(
-                        path=artifact_path,
-                        step_name=step_name,
-                        script_path=script_path,
-                        dependencies=step.inputs
-                    )
-        return None
+        step = self._find_step_for_output(artifact_path)
+        if step is None:
+            return None
+
+        # Try to find the script that generates this artifact
+        script_path = self._find_generating_script(step, artifact_path)
+        
+        return ArtifactMetadata(
+            path=artifact_path,
+            step_name=step.name,
+            script_path=script_path,
+            dependencies=step.inputs
+        )
     
     def _find_generating_script(self, step: PipelineStep, artifact_path: str) -> Optional[str]:
         """Find the script that generates a specific artifact"""
@@ -113,30 +246,59 @@ class MetadataProcessor:
                 
         return None
     
-    def _find_script_line_for_artifact(self, script_path: str, artifact_path: str) -> Optional[int]:
-        """Find the line number in a script that generates a specific artifact"""
+    def _get_script_text(self, script_path: str) -> Optional[str]:
+        """Read a script once and reuse its text for every artifact it generates"""
         if not script_path:
             return None
             
-        script_full_path = self.project_root / script_path
+        script_full_path = (self.project_root / script_path).resolve()
+        text = self._script_text_cache.get(script_full_path)
+        if text is not None:
+            return text
+
         if not script_full_path.exists():
             return None
             
         try:
-            with open(script_full_path, 'r') as f:
-                lines = f.readlines()
-                
-            # Look for lines that reference the artifact file
-            artifact_name = Path(artifact_path).name
-            for i, line in enumerate(lines, 1):
-                if artifact_name in line and ('savefig' in line or 'save' in line or 'write' in line):
-                    return i
-                    
+            text = script_full_path.read_text()
         except Exception:
-            pass
+            return None
+
+        self._script_text_cache[script_full_path] = text
+        return text
+
+    def _scan_script_for(self, script_path: str, needle: Optional[str], keyword_re: re.Pattern) -> Optional[int]:
+        """Find the first script line containing needle (if given) and matching keyword_re.
+
+        Searches the whole script text rather than splitting it into lines, and
+        only counts newlines once a matching line is found.
+        """
+        text = self._get_script_text(script_path)
+        if text is None:
+            return None
+
+        # An empty needle is in every line; text.find("") would never advance
+        if not needle:
+            match = keyword_re.search(text)
+            return text.count('\n', 0, match.start()) + 1 if match else None
+
+        pos = text.find(needle)
+        while pos >= 0:
+            line_start = text.rfind('\n', 0, pos) + 1
+            line_end = text.find('\n', pos)
+            if line_end < 0:
+                line_end = len(text)
+            if keyword_re.search(text, line_start, line_end):
+                return text.count('\n', 0, line_start) + 1
+            pos = text.find(needle, line_end)
             
         return None
     
+    def _find_script_line_for_artifact(self, script_path: str, artifact_path: str) -> Optional[int]:
+        """Find the line number in a script that generates a specific artifact"""
+        # Look for lines that reference the artifact file
+        return self._scan_script_for(script_path, Path(artifact_path).name, _SAVE_KW_RE)
+    
     def discover_artifacts_in_latex(self, latex_file: str) -> List[Dict[str, Any]]:
         """Discover computational artifacts referenced in a LaTeX document using the new simplified commands."""
         # The latex_file path might be relative to the project root or absolute.
@@ -148,20 +310,14 @@ class MetadataProcessor:
         if not latex_path.exists():
             raise FileNotFoundError(f"LaTeX file not found: {latex_path}")
 
-        with open(latex_path, 'r') as f:
-            content = f.read()
-
         artifacts = []
-        
-        # New simplified patterns
-        patterns = {
-            'value': r'\\csfvaluelink\{([^}]+)\}',
-            'artifact': r'\\csflink\{([^}]+)\}'
-        }
 
-        for artifact_type, pattern in patterns.items():
-            for match in re.finditer(pattern, content):
-                name = match.group(1)
+        # Single pass in document order over the mapped file, so artifacts come
+        # out sorted by position; match offsets are byte offsets into the file
+        with _map_file(latex_path) as content:
+            for match in _CSF_LINK_RE.finditer(content):
+                artifact_type = _CSF_LINK_TYPES[match.lastindex]
+                name = match.group(match.lastindex).decode('utf-8')
                 # Look up metadata in the parsed composable.toml config
                 metadata = self._find_metadata_for_artifact(name, artifact_type)
                 if metadata:
@@ -179,29 +335,21 @@ class MetadataProcessor:
     
     def _find_metadata_for_artifact(self, name: str, artifact_type: str) -> Optional[Dict[str, Any]]:
         """Find artifact metadata from the parsed composable.toml."""
-        for step in self.config.get("pipeline", []):
-            # The 'outputs' key is a list of strings. We need to check if the artifact
-            # name matches any of the output patterns.
-            for output_pattern in step.get("outputs", []):
-                # Convert glob to regex
-                regex_pattern = output_pattern.replace("*", ".*").replace("?", ".")
-                if re.match(regex_pattern, name):
-                    return {
-                        "step": step.get("name"),
-                        "script": step.get("cmd", "").split()[-1], # simplified
-                        "dependencies": step.get("inputs", [])
-                    }
-        return None
+        # Resolved against the output indexes built in _load_config; the raw
+        # config is never consulted at scan time.
+        step = self._find_step_for_output(name)
+        if step is None:
+            return None
+        return {
+            "step": step.name,
+            "script": step.cmd.split()[-1], # simplified
+            "dependencies": step.inputs
+        }
     
     def _parse_csf_annotation(self, annotation_type: str, params_str: str, line_num: int, content: str) -> Optional[Tuple[str, Dict[str, Any]]]:
         """Parse a single CSF annotation"""
         # Parse key=value pairs
-        params = {}
-        for param in params_str.split(','):
-            param = param.strip()
-            if '=' in param:
-                key, value = param.split('=', 1)
-                params[key.strip()] = value.strip()
+        params = {key: value.strip() for key, value in _KV_RE.findall(params_str)}
         
         if annotation_type == 'CSF-ARTIFACT':
             # Figure/artifact annotation
@@ -263,23 +411,22 @@ class MetadataProcessor:
         
         return None
     
-    def _discover_figure_artifacts(self, content: str) -> List[Tuple[str, Dict[str, Any]]]:
+    def _discover_figure_artifacts(self, content: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
         """Discover figure artifacts (images)"""
-        artifacts = []
-        
+        # Index every manual \csfigure once, instead of slicing and searching
+        # a context window around each \includegraphics
+        csfigure_positions = [m.start() for m in _CSFIGURE_RE.finditer(content)]
+
         # Find all \includegraphics commands
-        includegraphics_pattern = r'\\includegraphics(?:\[[^\]]*\])?\{([^}]+)\}'
-        matches = re.finditer(includegraphics_pattern, content)
+        matches = _INCLUDEGRAPHICS_RE.finditer(content)
         
         for match in matches:
             artifact_path = match.group(1)
             
-            # Skip if this artifact is already using manual CSF commands
-            context_start = max(0, match.start() - 200)
-            context_end = min(len(content), match.end() + 200)
-            context = content[context_start:context_end]
-            
-            if '\\csfigure' in context:
+            # Skip if this artifact is already using manual CSF commands, i.e. a
+            # \csfigure lies entirely within 200 characters of the match
+            idx = bisect.bisect_left(csfigure_positions, match.start() - 200)
+            if idx < len(csfigure_positions) and csfigure_positions[idx] <= match.end() + 200 - len('\\csfigure'):
                 continue  # Skip artifacts already handled manually
                 
             # Try to match this artifact to a pipeline step
@@ -306,17 +453,14 @@ class MetadataProcessor:
                     'match_end': match.end()
                 }
                 
-                artifacts.append((artifact_path, artifact_info))
-                
-        return artifacts
+                yield (artifact_path, artifact_info)
     
-    def _discover_table_artifacts(self, content: str) -> List[Tuple[str, Dict[str, Any]]]:
+    def _discover_table_artifacts(self, content: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
         """Discover table artifacts (CSV files, LaTeX tables with data)"""
-        artifacts = []
+        found = 0
         
         # 1. Find \input{} commands that reference CSV or data files
-        input_pattern = r'\\input\{([^}]+\.csv)\}'
-        matches = re.finditer(input_pattern, content)
+        matches = _INPUT_CSV_RE.finditer(content)
         
         for match in matches:
             csv_path = match.group(1)
@@ -337,92 +481,53 @@ class MetadataProcessor:
                     'match_start': match.start(),
                     'match_end': match.end()
                 }
-                artifacts.append((csv_path, artifact_info))
-        
-        # 2. Find tables with computational content (containing numbers)
-        table_pattern = r'\\begin\{(table|tabular)\}.*?\\end\{\1\}'
-        matches = re.finditer(table_pattern, content, re.DOTALL)
-        
-        for match in matches:
-            table_content = match.group(0)
+                found += 1
+                yield (csv_path, artifact_info)
+        
+        # 2. Find tables with computational content (containing numbers).
+        # Locate each \begin with the regex and its \end with str.find, so the
+        # scan stays linear; tables nested in a matched one are skipped.
+        pos = 0
+        while (match := _BEGIN_TABLE_RE.search(content, pos)):
+            end_tag = f"\\end{{{match.group(1)}}}"
+            end_pos = content.find(end_tag, match.end())
+            if end_pos < 0:
+                pos = match.end()
+                continue
+            pos = end_pos + len(end_tag)
+            table_content = content[match.start():pos]
             
             # Check if table contains computational data (numbers, percentages, etc.)
             if self._contains_computational_data(table_content):
                 # Try to find associated scripts by looking at nearby comments or context
                 table_info = self._analyze_computational_table(table_content, match.start(), content)
                 if table_info:
-                    artifacts.append((f"table_{len(artifacts)}", table_info))
-        
-        return artifacts
+                    yield (f"table_{found}", table_info)
+                    found += 1
     
-    def _discover_statistical_artifacts(self, content: str) -> List[Tuple[str, Dict[str, Any]]]:
+    def _discover_statistical_artifacts(self, content: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
         """Discover statistical outputs (inline numbers, p-values, correlations)"""
-        artifacts = []
-        
-        # Patterns for common statistical outputs
-        stat_patterns = [
-            # p-values: p = 0.05, p < 0.001, etc.
-            (r'p\s*[=<>]\s*([0-9]+\.?[0-9]*(?:e-?[0-9]+)?)', 'p_value'),
-            
-            # Correlations: r = 0.85, R² = 0.72, etc.
-            (r'[Rr]²?\s*=\s*([0-9]+\.?[0-9]*)', 'correlation'),
-            
-            # Confidence intervals: 95% CI [1.2, 3.4]
-            (r'(\d+)%\s*CI\s*\[([0-9.,\-\s]+)\]', 'confidence_interval'),
-            
-            # Sample sizes: n = 1000, N = 500
-            (r'[Nn]\s*=\s*([0-9,]+)', 'sample_size'),
-            
-            # Means and standard deviations: μ = 42.5 ± 3.2
-            (r'[μm]\s*=\s*([0-9.]+)\s*[±]\s*([0-9.]+)', 'mean_std'),
-            
-            # Percentages: 85.3%, significant at α = 0.05
-            (r'([0-9.]+)%', 'percentage'),
-            (r'α\s*=\s*([0-9.]+)', 'alpha_level')
-        ]
-        
-        for pattern, stat_type in stat_patterns:
-            matches = re.finditer(pattern, content)
-            for match in matches:
-                # Try to find the computational context for this statistic
-                context_info = self._find_statistical_context(match, content, stat_type)
-                if context_info:
-                    artifacts.append((f"stat_{stat_type}_{match.start()}", context_info))
-        
-        return artifacts
+        for match in itertools.chain(_STAT_RE.finditer(content), _PERCENTAGE_RE.finditer(content)):
+            stat_type = match.lastgroup
+            # Try to find the computational context for this statistic
+            context_info = self._find_statistical_context(match, content, stat_type)
+            if context_info:
+                yield (f"stat_{stat_type}_{match.start()}", context_info)
     
     def _find_script_line_for_csv(self, script_path: str, csv_path: str) -> Optional[int]:
         """Find the line number that generates a CSV file"""
-        if not script_path:
-            return None
-            
-        script_full_path = self.project_root / script_path
-        if not script_full_path.exists():
-            return None
-            
-        try:
-            with open(script_full_path, 'r') as f:
-                lines = f.readlines()
-                
-            # Look for lines that write to CSV files
-            csv_name = Path(csv_path).name
-            for i, line in enumerate(lines, 1):
-                if csv_name in line and ('to_csv' in line or 'csv' in line.lower() and 'write' in line):
-                    return i
-                    
-        except Exception:
-            pass
-            
-        return None
+        # Look for lines that write to CSV files; csv_name itself contains "csv",
+        # so any line mentioning it already mentions csv
+        return self._scan_script_for(script_path, Path(csv_path).name, _CSV_WRITE_KW_RE)
     
     def _contains_computational_data(self, table_content: str) -> bool:
         """Check if a table contains computational data"""
-        # Look for numerical data patterns
-        number_pattern = r'\b\d+\.?\d*\b'
-        numbers = re.findall(number_pattern, table_content)
-        
-        # Consider it computational if it has multiple numbers
-        return len(numbers) > 3
+        # Look for numerical data patterns; consider it computational if it
+        # has more than three numbers, stopping as soon as the fourth is found
+        for count, _ in enumerate(_NUMBER_RE.finditer(table_content), 1):
+            if count > 3:
+                return True
+        return False
     
     def _analyze_computational_table(self, table_content: str, table_start: int, full_content: str) -> Optional[Dict[str, Any]]:
         """Analyze a computational table to find its generating script"""
@@ -432,8 +537,7 @@ class MetadataProcessor:
         context = full_content[context_start:context_end]
         
         # Try to find script references in comments
-        script_pattern = r'%.*?([a-zA-Z_][a-zA-Z0-9_]*\.py)'
-        match = re.search(script_pattern, context)
+        match = _COMMENT_SCRIPT_REF_RE.search(context)
         
         if match:
             script_path = match.group(1)
@@ -461,8 +565,7 @@ class MetadataProcessor:
         context = content[context_start:context_end]
         
         # Try to find script references
-        script_pattern = r'([a-zA-Z_][a-zA-Z0-9_]*\.py)'
-        script_match = re.search(script_pattern, context)
+        script_match = _SCRIPT_REF_RE.search(context)
         
         if script_match:
             script_path = script_match.group(1)
@@ -486,36 +589,14 @@ class MetadataProcessor:
     
     def _find_statistical_line(self, script_path: str, stat_value: str) -> Optional[int]:
         """Find the line that computes a statistical value"""
-        if not script_path:
-            return None
-            
-        script_full_path = self.project_root / script_path
-        if not script_full_path.exists():
-            return None
-            
-        try:
-            with open(script_full_path, 'r') as f:
-                lines = f.readlines()
-                
-            # Look for statistical computation patterns
-            for i, line in enumerate(lines, 1):
-                # Look for common statistical functions
-                if any(func in line.lower() for func in ['corr', 'mean', 'std', 'pvalue', 'ttest', 'chi2']):
-                    return i
-                    
-        except Exception:
-            pass
-            
-        return None
+        # Look for common statistical functions
+        return self._scan_script_for(script_path, None, _STAT_KW_RE)
     
     def _find_caption_for_artifact(self, content: str, artifact_end_pos: int) -> Optional[str]:
         """Find the caption associated with an artifact"""
         # Look for \caption{...} after the \includegraphics
-        caption_pattern = r'\\caption\{([^}]+)\}'
-        
-        # Search in the next 500 characters
-        search_region = content[artifact_end_pos:artifact_end_pos + 500]
-        match = re.search(caption_pattern, search_region)
+        # Search in the next 500 characters, without slicing out a copy
+        match = _CAPTION_RE.search(content, artifact_end_pos, artifact_end_pos + 500)
         
         if match:
             return match.group(1)
@@ -529,23 +610,13 @@ class MetadataProcessor:
         # Generate project ID based on package name and version
         project_name = package_info.get("name", "unknown")
         project_version = package_info.get("version", "0.0.1")
-        project_id = hashlib.md5(f"{project_name}-{project_version}".encode()).hexdigest()[:12]
+        project_id = hashlib.blake2b(f"{project_name}-{project_version}".encode(), digest_size=6).hexdigest()
         
         # Get dashboard URL
         dashboard_url = build_info.get("dashboard_base_url", "https://dashboard.composable-science.org")
         
         # Try to get git commit
-        git_commit = "unknown"
-        try:
-            import subprocess
-            result = subprocess.run(
-                ["git", "rev-parse", "--short", "HEAD"],
-                capture_output=True, text=True, cwd=self.project_root
-            )
-            if result.returncode == 0:
-                git_commit = result.stdout.strip()
-        except:
-            pass
+        git_commit = _git_short_head(str(self.project_root))
         
         config_content = f"""% CSF Configuration - Auto-generated by process-metadata.py
 % Project: {project_name} v{project_version}
@@ -576,45 +647,46 @@ class MetadataProcessor:
                 output_file = self.project_root / output_file
 
 
-        with open(latex_path, 'r') as f:
-            content = f.read()
-
         # Discover artifacts using the new simplified commands
         artifacts = self.discover_artifacts_in_latex(latex_file)
-        
-        enhanced_content = list(content)
 
-        # Process artifacts in reverse to not mess up indices
-        for artifact in reversed(artifacts):
-            info = artifact['metadata']
-            start_index = artifact['match_start']
-            
-            # Create the metadata comment
-            metadata_comment = (
-                f"% CSF-AUTO-METADATA: type={artifact['type']}, "
-                f"name={artifact['name']}, "
-                f"step={info.get('step', 'unknown')}, "
-                f"script={info.get('script', 'unknown')}, "
-                f"line={info.get('line', 'unknown')}\n"
-            )
-            
-            # Insert the comment before the command
-            enhanced_content.insert(start_index, metadata_comment)
+        with _map_file(latex_path) as content:
+            insertions = []
 
-        enhanced_content = "".join(enhanced_content)
-        
-        # Add composable package if not already present
-        if '\\usepackage{composable}' not in enhanced_content:
-            enhanced_content = re.sub(
-                r'(\\documentclass\{[^}]+\})',
-                r'\1\n\\usepackage{composable}',
-                enhanced_content,
-                count=1
-            )
+            # Add composable package if not already present
+            if content.find(b'\\usepackage{composable}') < 0:
+                match = _DOCUMENTCLASS_RE.search(content)
+                if match:
+                    insertions.append((match.end(), b'\n\\usepackage{composable}'))
+
+            for artifact in artifacts:
+                info = artifact['metadata']
+                
+                # Create the metadata comment
+                metadata_comment = (
+                    f"% CSF-AUTO-METADATA: type={artifact['type']}, "
+                    f"name={artifact['name']}, "
+                    f"step={info.get('step', 'unknown')}, "
+                    f"script={info.get('script', 'unknown')}, "
+                    f"line={info.get('line', 'unknown')}\n"
+                )
+                
+                # Insert the comment before the command
+                insertions.append((artifact['match_start'], metadata_comment.encode('utf-8')))
 
-        # Write enhanced document
-        with open(output_file, 'w') as f:
-            f.write(enhanced_content)
+            # Stream slices of the mapped source into the enhanced document in
+            # document order, splicing in each insertion. Write to a temporary
+            # file first, since output_file may be the mapped source itself.
+            insertions.sort(key=lambda insertion: insertion[0])
+            tmp_file = output_file.with_name(output_file.name + '.tmp')
+            with open(tmp_file, 'wb') as f:
+                prev_index = 0
+                for index, text in insertions:
+                    f.write(content[prev_index:index])
+                    f.write(text)
+                    prev_index = index
+                f.write(content[prev_index:])
+            os.replace(tmp_file, output_file)
             
         return str(output_file)
     